@@ -1,8 +1,12 @@
 """Configuration settings for the NYC 311 Data MCP Server."""
 
+import atexit
 import logging
+import logging.handlers
+import queue
+import re
 import sys
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 
 
@@ -36,8 +40,18 @@ class LoggerConfig:
         file_handler.setFormatter(formatter)
         console_handler.setFormatter(formatter)
 
-        logger.addHandler(file_handler)
-        logger.addHandler(console_handler)
+        # Records are still formatted on the thread that logs them, but only
+        # enqueued there; a background listener thread does the blocking
+        # writes to disk and stdout
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.listener = logging.handlers.QueueListener(
+            log_queue, file_handler, console_handler, respect_handler_level=True
+        )
+        queue_handler.listener.start()
+        atexit.register(queue_handler.listener.stop)
+
+        logger.addHandler(queue_handler)
         logger.propagate = False
 
         return logger
@@ -62,10 +76,24 @@ class ServerConfig:
     # Database settings
     database_type: str = ":memory:"
     read_only: bool = False
+    # Copy the parquet data into memory instead of querying it through a view
+    materialize_tables: bool = False
+    # Serve queries from a native DuckDB file built once from the parquet data
+    use_native_database: bool = True
+
+    # DuckDB connection settings (None keeps the DuckDB default)
+    duckdb_threads: int | None = None
+    duckdb_memory_limit: str | None = None
+    duckdb_enable_object_cache: bool = True
+    # Requires DuckDB 1.3+; ignored on older versions
+    duckdb_enable_external_file_cache: bool = True
 
     # File paths (relative to project root)
     categories_file: str = "data/categories.json"
     service_requests_file: str = "data/cityofnewyork/service_requests_2024.parquet"
+    service_requests_database_file: str = (
+        "data/cityofnewyork/service_requests_2024.duckdb"
+    )
 
     # Logging configuration
     log_level: str = "INFO"
@@ -95,7 +123,18 @@ class ServerConfig:
         "TRUNCATE",
         "EXEC",
         "EXECUTE",
+        "PRAGMA",
     )
+    # Compiled from forbidden_sql_keywords once, when the config is created
+    forbidden_keyword_pattern: re.Pattern[str] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        """Pre-compile the forbidden keyword matcher used by query validation."""
+        # Longest first so EXECUTE is preferred over its prefix EXEC
+        keywords = sorted(set(self.forbidden_sql_keywords), key=len, reverse=True)
+        self.forbidden_keyword_pattern = re.compile(
+            r"\b(" + "|".join(map(re.escape, keywords)) + r")\b", re.IGNORECASE
+        )
 
 
 # Default configuration instance
@@ -2,21 +2,124 @@
 Database operations and management for the NYC 311 Data MCP Server.
 """
 
+import hashlib
 import logging
+import re
 import time
-from typing import Any
-
-import duckdb
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any
 
+from .config import ServerConfig, default_config
 from .exceptions import DatabaseError, ValidationError
 
+if TYPE_CHECKING:
+    import duckdb
+    import pyarrow
+
+# Returned instead of the schema when it cannot be read from the database
+SCHEMA_ERROR_MESSAGE = "Error retrieving schema information"
+
+_SELECT_STAR_RE = re.compile(r"\bSELECT\s+\*", re.IGNORECASE)
+_LIMIT_RE = re.compile(r"\bLIMIT\b", re.IGNORECASE)
+_ALLOWED_STATEMENT_KEYWORDS = ("SELECT", "WITH")
+
+
+def _statement_start(sql: str) -> int:
+    """Return the index of the first character after leading whitespace and comments."""
+    i = 0
+    length = len(sql)
+    while i < length:
+        if sql[i].isspace():
+            i += 1
+        elif sql.startswith("--", i):
+            newline = sql.find("\n", i)
+            i = length if newline == -1 else newline + 1
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+        else:
+            break
+    return i
+
+
+def _leading_keyword(sql: str) -> str | None:
+    """Return the allowed keyword (SELECT or WITH) the statement starts with, if any."""
+    start = _statement_start(sql)
+    for keyword in _ALLOWED_STATEMENT_KEYWORDS:
+        end = start + len(keyword)
+        # Only the keyword-sized slice is uppercased, never the whole query
+        if sql[start:end].upper() != keyword:
+            continue
+        if end < len(sql) and (sql[end].isalnum() or sql[end] == "_"):
+            continue
+        return keyword
+    return None
+
+
+def _query_preview(query: str) -> str:
+    """Shorten a query for log messages."""
+    return query[:100] + "..." if len(query) > 100 else query
+
 
 class DatabaseManager:
     """Handles database operations with proper error handling."""
 
-    def __init__(self, db: duckdb.DuckDBPyConnection, logger: logging.Logger):
+    # The dataset is read-only, so cached results never need invalidation
+    MAX_CACHED_QUERIES: int = 256
+    MAX_CACHED_ROWS: int = 10000
+    # Rows fetched per chunk when streaming results
+    STREAM_CHUNK_SIZE: int = 2048
+    MAX_PARSED_STATEMENTS: int = 128
+
+    def __init__(
+        self,
+        db: "duckdb.DuckDBPyConnection",
+        logger: logging.Logger,
+        config: ServerConfig = default_config,
+    ):
         self.db = db
         self.logger = logger
+        # Compiled by the config, so validation is a single pass over the query
+        self._forbidden_keyword_re = config.forbidden_keyword_pattern
+        self._result_cache: OrderedDict[tuple, list[dict[str, Any]]] = OrderedDict()
+        self._parsed_statements: OrderedDict[str, duckdb.Statement | str] = (
+            OrderedDict()
+        )
+        # The table schema never changes, so the fallback text is built only once
+        self._basic_schema_info: str | None = None
+
+    def _parse_query(self, query: str) -> "duckdb.Statement | str":
+        """
+        Return the parsed statement for a query, reusing earlier parses.
+
+        DuckDB executes a parsed Statement without running the parser again.
+        Multi-statement queries are returned unchanged so DuckDB runs all of them.
+        """
+        key = query.strip()
+        statement = self._parsed_statements.get(key)
+        if statement is not None:
+            self._parsed_statements.move_to_end(key)
+            return statement
+
+        statements = self.db.extract_statements(query)
+        statement = statements[0] if len(statements) == 1 else query
+        self._parsed_statements[key] = statement
+        if len(self._parsed_statements) > self.MAX_PARSED_STATEMENTS:
+            self._parsed_statements.popitem(last=False)
+        return statement
+
+    @staticmethod
+    def _cache_key(query: str, params: dict | None) -> tuple | None:
+        """Build a result cache key, or None if the parameters are not hashable."""
+        digest = hashlib.blake2b(query.strip().encode(), digest_size=16).digest()
+        param_items = tuple(sorted(params.items())) if params else ()
+        try:
+            hash(param_items)
+        except TypeError:
+            return None
+        return digest, param_items
 
     def execute_query(
         self, query: str, params: dict | None = None
@@ -34,49 +137,179 @@ class DatabaseManager:
         Raises:
             DatabaseError: If query execution fails
         """
+        result_dicts: list[dict[str, Any]] = []
+        for chunk in self.execute_query_streaming(query, params):
+            result_dicts.extend(chunk)
+        return result_dicts
+
+    def execute_query_streaming(
+        self,
+        query: str,
+        params: dict | None = None,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """
+        Execute a SQL query and yield the results in chunks of rows.
+
+        Rows are fetched chunk_size at a time with DuckDB's own Python
+        conversion, so the values have the same types as fetchall() and the
+        full result is never materialized at once. The query runs on its own
+        cursor, so other requests can use the connection while the caller
+        consumes the chunks.
+
+        Args:
+            query: SQL query string with parameter placeholders
+            params: Dictionary of parameters to bind to the query
+            chunk_size: Maximum number of rows per yielded chunk
+
+        Yields:
+            Lists of dictionaries representing consecutive result rows
+
+        Raises:
+            DatabaseError: If query execution fails
+        """
+        cache_key = self._cache_key(query, params)
+        if cache_key is not None and cache_key in self._result_cache:
+            self._result_cache.move_to_end(cache_key)
+            cached = self._result_cache[cache_key]
+            self.logger.info("Query served from cache: %d rows", len(cached))
+            yield list(cached)
+            return
+
         query_start_time = time.time()
-        try:
-            self.logger.info(
-                "Executing query",
-                extra={
-                    "query_preview": query[:100] + "..." if len(query) > 100 else query,
-                    "has_params": bool(params),
-                    "param_count": len(params) if params else 0,
-                },
+        with self._query_cursor(query, params) as cursor:
+            columns = [desc[0] for desc in cursor.description]
+            # Results are only kept for the cache while they are small enough
+            cached_rows: list[dict[str, Any]] | None = (
+                [] if cache_key is not None else None
             )
+            row_count = 0
+            while rows := cursor.fetchmany(chunk_size):
+                chunk = [dict(zip(columns, row, strict=True)) for row in rows]
+                row_count += len(chunk)
+                if cached_rows is not None:
+                    if row_count <= self.MAX_CACHED_ROWS:
+                        cached_rows.extend(chunk)
+                    else:
+                        cached_rows = None
+                yield chunk
+            column_count = len(columns)
+
+        self._log_query_success(row_count, column_count, query_start_time)
+        if cached_rows is not None:
+            self._result_cache[cache_key] = cached_rows
+            if len(self._result_cache) > self.MAX_CACHED_QUERIES:
+                self._result_cache.popitem(last=False)
+
+    def execute_query_columns(
+        self, query: str, params: dict | None = None
+    ) -> dict[str, list[Any]]:
+        """
+        Execute a SQL query and return the result as lists of values per column.
+
+        Values are converted like execute_query_streaming rows, but no row
+        dictionaries are built and the result cache is bypassed.
+
+        Args:
+            query: SQL query string with parameter placeholders
+            params: Dictionary of parameters to bind to the query
+
+        Returns:
+            Dictionary mapping each column name to its list of values
+
+        Raises:
+            DatabaseError: If query execution fails
+        """
+        query_start_time = time.time()
+        with self._query_cursor(query, params) as cursor:
+            columns: dict[str, list[Any]] = {desc[0]: [] for desc in cursor.description}
+            row_count = 0
+            while rows := cursor.fetchmany(self.STREAM_CHUNK_SIZE):
+                for values, column_values in zip(
+                    columns.values(), zip(*rows, strict=True), strict=True
+                ):
+                    values.extend(column_values)
+                row_count += len(rows)
+
+        self._log_query_success(row_count, len(columns), query_start_time)
+        return columns
+
+    def execute_query_arrow(
+        self, query: str, params: dict | None = None
+    ) -> "pyarrow.Table":
+        """
+        Execute a SQL query and return the result as an Arrow table.
+
+        No Python row objects are built and the result cache is bypassed, for
+        callers that serialize the columnar result directly.
+
+        Args:
+            query: SQL query string with parameter placeholders
+            params: Dictionary of parameters to bind to the query
+
+        Returns:
+            Arrow table holding the query result
+
+        Raises:
+            DatabaseError: If query execution fails
+        """
+        query_start_time = time.time()
+        with self._query_cursor(query, params) as cursor:
+            table = cursor.fetch_arrow_table()
+
+        self._log_query_success(table.num_rows, table.num_columns, query_start_time)
+        return table
+
+    @contextmanager
+    def _query_cursor(
+        self, query: str, params: dict | None
+    ) -> Iterator["duckdb.DuckDBPyConnection"]:
+        """
+        Run a query on its own cursor and yield the cursor holding the result.
+
+        Errors raised while executing or reading the result are logged and
+        re-raised as DatabaseError.
+        """
+        query_start_time = time.time()
+        cursor = self.db.cursor()
+        try:
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug(
+                    "Executing query with %d params: %s",
+                    len(params) if params else 0,
+                    _query_preview(query),
+                )
 
             # Use parameter binding instead of f-strings for security
+            statement = self._parse_query(query)
             if params:
-                result = self.db.execute(query, params).fetchall()
+                cursor.execute(statement, params)
             else:
-                result = self.db.execute(query).fetchall()
-
-            columns = [desc[0] for desc in self.db.description]
-            result_dicts = [dict(zip(columns, row, strict=True)) for row in result]
-
-            query_duration = time.time() - query_start_time
-            self.logger.info(
-                "Query executed successfully",
-                extra={
-                    "row_count": len(result_dicts),
-                    "execution_time_ms": round(query_duration * 1000, 2),
-                    "column_count": len(columns),
-                },
-            )
-            return result_dicts
+                cursor.execute(statement)
+            yield cursor
 
         except Exception as e:
-            query_duration = time.time() - query_start_time
             self.logger.error(
-                "Database query failed",
-                extra={
-                    "error_type": type(e).__name__,
-                    "error_message": str(e),
-                    "execution_time_ms": round(query_duration * 1000, 2),
-                    "query_preview": query[:100] + "..." if len(query) > 100 else query,
-                },
+                "Database query failed after %.2f ms with %s: %s (query: %s)",
+                (time.time() - query_start_time) * 1000,
+                type(e).__name__,
+                e,
+                _query_preview(query),
             )
             raise DatabaseError(f"Query execution failed: {e}") from e
+        finally:
+            cursor.close()
+
+    def _log_query_success(
+        self, row_count: int, column_count: int, query_start_time: float
+    ) -> None:
+        """Log the size and duration of a completed query."""
+        self.logger.info(
+            "Query executed successfully: %d rows, %d columns in %.2f ms",
+            row_count,
+            column_count,
+            (time.time() - query_start_time) * 1000,
+        )
 
     def validate_sql_query(self, sql: str) -> None:
         """
@@ -88,35 +321,22 @@ class DatabaseManager:
         Raises:
             ValidationError: If query contains potentially dangerous operations
         """
-        if not sql or not sql.strip():
+        if not sql or sql.isspace():
             raise ValidationError("SQL query cannot be empty")
 
-        sql_upper = sql.upper().strip()
-
-        # Block dangerous operations
-        dangerous_keywords = [
-            "DROP",
-            "DELETE",
-            "UPDATE",
-            "INSERT",
-            "ALTER",
-            "CREATE",
-            "TRUNCATE",
-            "EXEC",
-            "EXECUTE",
-            "PRAGMA",
-        ]
-
-        for keyword in dangerous_keywords:
-            if keyword in sql_upper:
-                raise ValidationError(f"Query contains forbidden keyword: {keyword}")
-
-        # Ensure query starts with SELECT
-        if not sql_upper.startswith("SELECT"):
+        # Block dangerous operations (matched as whole words, case-insensitive)
+        match = self._forbidden_keyword_re.search(sql)
+        if match:
+            raise ValidationError(
+                f"Query contains forbidden keyword: {match.group(1).upper()}"
+            )
+
+        # Ensure query starts with SELECT (or a WITH clause feeding a SELECT)
+        if _leading_keyword(sql) is None:
             raise ValidationError("Only SELECT queries are allowed")
 
         # Check for potential performance issues
-        if "SELECT *" in sql_upper and "LIMIT" not in sql_upper:
+        if _SELECT_STAR_RE.search(sql) and not _LIMIT_RE.search(sql):
             raise ValidationError(
                 "SELECT * queries must include a LIMIT clause for performance reasons"
             )
@@ -129,28 +349,21 @@ class DatabaseManager:
             Schema information including column names, types, and descriptions from metadata
         """
         try:
-            # First, try to get comments from DuckDB metadata if available
-            try:
-                comments_query = """
-                    SELECT column_name, comment
-                    FROM duckdb_columns()
-                    WHERE table_name = 'service_requests' AND comment IS NOT NULL
-                """
-                comment_result = self.db.execute(comments_query).fetchall()
-                comments_dict = {row[0]: row[1] for row in comment_result}
-            except Exception:
-                # If that fails, we'll use our predefined descriptions
-                comments_dict = {}
-
-            # Get basic column information
+            # Column types and comments from DuckDB metadata in a single query
             schema_query = """
-                SELECT 
-                    column_name, 
-                    data_type, 
-                    is_nullable
-                FROM information_schema.columns
-                WHERE table_name = 'service_requests'
-                ORDER BY ordinal_position
+                SELECT
+                    c.column_name,
+                    c.data_type,
+                    c.is_nullable,
+                    d.comment
+                FROM information_schema.columns c
+                LEFT JOIN duckdb_columns() d
+                    ON d.database_name = c.table_catalog
+                    AND d.schema_name = c.table_schema
+                    AND d.table_name = c.table_name
+                    AND d.column_name = c.column_name
+                WHERE c.table_name = 'service_requests'
+                ORDER BY c.ordinal_position
             """
 
             result = self.db.execute(schema_query).fetchall()
@@ -162,10 +375,9 @@ class DatabaseManager:
                 schema_info.append("")
 
                 for row in result:
-                    col_name, data_type, nullable = row
+                    col_name, data_type, nullable, description = row
                     nullable_text = "nullable" if nullable == "YES" else "not null"
                     # Use comment from database if available
-                    description = comments_dict.get(col_name, "")
                     comment_text = f" - {description}" if description else ""
                     schema_info.append(
                         f"- {col_name}: {data_type} ({nullable_text}){comment_text}"
@@ -187,6 +399,9 @@ class DatabaseManager:
         Returns:
             Basic schema information
         """
+        if self._basic_schema_info is not None:
+            return self._basic_schema_info
+
         try:
             schema_query = """
                 SELECT column_name, data_type, is_nullable
@@ -202,8 +417,12 @@ class DatabaseManager:
                     col_name, data_type, nullable = row
                     nullable_text = "nullable" if nullable == "YES" else "not null"
                     schema_info.append(f"- {col_name}: {data_type} ({nullable_text})")
-                return "\n".join(schema_info)
+                self._basic_schema_info = "\n".join(schema_info)
+                return self._basic_schema_info
+
+            self.logger.error("Failed to get basic schema: no service_requests columns")
+            return SCHEMA_ERROR_MESSAGE
 
         except Exception as e:
             self.logger.error(f"Failed to get basic schema: {e}")
-            return "Error retrieving schema information"
+            return SCHEMA_ERROR_MESSAGE
@@ -2,96 +2,203 @@
 Data models and context classes for the NYC 311 Data MCP Server.
 """
 
-import contextlib
-from dataclasses import dataclass
+import logging
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import duckdb
-
+from .config import ServerConfig, default_config
+from .database import SCHEMA_ERROR_MESSAGE, DatabaseManager
 from .exceptions import DatabaseError
 
+if TYPE_CHECKING:
+    import duckdb
+
+SERVICE_REQUESTS_PARQUET = "cityofnewyork/service_requests_2024.parquet"
+SERVICE_REQUESTS_DATABASE = "cityofnewyork/service_requests_2024.duckdb"
+
 
 @dataclass
 class AppContext:
     """Application context containing shared resources."""
 
-    db: duckdb.DuckDBPyConnection
+    db: "duckdb.DuckDBPyConnection"
     data_dir: Path
+    logger: logging.Logger = field(default_factory=lambda: logging.getLogger(__name__))
+    materialize: bool = False
+    # Set when db is a native database file that already holds the tables
+    preloaded: bool = False
+    config: ServerConfig = field(default_factory=lambda: default_config)
+    db_manager: DatabaseManager = field(init=False)
+    # Schema description, computed once since the tables never change after startup
+    schema_cache: str | None = field(init=False, default=None)
 
     def __post_init__(self) -> None:
-        """Initialize database tables after context creation."""
-        self._initialize_tables()
+        """Initialize database tables, the shared database manager and schema cache."""
+        if not self.preloaded:
+            self._initialize_tables()
+        self.db_manager = DatabaseManager(self.db, self.logger, self.config)
+        self.get_schema_info()
+
+    def get_schema_info(self) -> str:
+        """Return the cached schema description, querying the database if unset."""
+        if self.schema_cache is not None:
+            return self.schema_cache
+
+        schema_info = self.db_manager.get_schema_info()
+        # Errors are not cached, so the next call queries the database again
+        if schema_info != SCHEMA_ERROR_MESSAGE:
+            self.schema_cache = schema_info
+        return schema_info
+
+    @classmethod
+    def build_database_file(cls, data_dir: Path, logger: logging.Logger) -> Path | None:
+        """
+        Convert the service requests parquet file into a native DuckDB database.
+
+        The database file is built once and reused on later startups, and is
+        rebuilt when the parquet file is newer than it.
+
+        Returns:
+            Path to the database file, or None if it could not be built
+        """
+        parquet_file = data_dir / SERVICE_REQUESTS_PARQUET
+        database_file = data_dir / SERVICE_REQUESTS_DATABASE
+
+        if database_file.exists() and (
+            not parquet_file.exists()
+            or database_file.stat().st_mtime >= parquet_file.stat().st_mtime
+        ):
+            return database_file
+        if not parquet_file.exists():
+            return None
+
+        # Build into a temporary file so a failed build never leaves a partial database
+        tmp_file = database_file.with_name(database_file.name + ".tmp")
+        try:
+            tmp_file.unlink(missing_ok=True)
+            import duckdb
+
+            logger.info(f"Building native database {database_file} from parquet")
+            db = duckdb.connect(database=str(tmp_file), read_only=False)
+            try:
+                cls(db=db, data_dir=data_dir, logger=logger, materialize=True)
+                db.execute("CHECKPOINT")
+            finally:
+                db.close()
+            tmp_file.replace(database_file)
+            return database_file
+        except Exception as e:
+            logger.error(f"Failed to build native database, using parquet: {e}")
+            tmp_file.unlink(missing_ok=True)
+            return None
 
     def _initialize_tables(self) -> None:
         """Pre-load data tables and add metadata comments."""
         try:
-            service_requests_file = (
-                self.data_dir / "cityofnewyork/service_requests_2024.parquet"
-            )
+            service_requests_file = self.data_dir / SERVICE_REQUESTS_PARQUET
             if service_requests_file.exists():
-                # Create the table from parquet file
-                self.db.execute(f"""
-                    CREATE TABLE IF NOT EXISTS service_requests AS
-                    SELECT * FROM '{service_requests_file}';
-                """)
-
-                # Add table comment
-                self.db.execute("""
-                    COMMENT ON TABLE service_requests IS 'NYC 311 Service Requests data for 2024 containing complaint information, locations, agencies, and resolution details';
-                """)
-
-                # Add column comments
-                column_comments = {
-                    "unique_key": "Unique identifier for each service request",
-                    "created_date": "Date/time the request was created",
-                    "closed_date": "Date/time the request was closed",
-                    "agency": "The agency responsible for the request",
-                    "agency_name": "Full name of the responsible agency",
-                    "complaint_type": "Type of complaint/request",
-                    "descriptor": "Detailed description of the issue",
-                    "location_type": "Type of location where issue occurred",
-                    "incident_zip": "ZIP code of the incident",
-                    "incident_address": "Street address of the incident",
-                    "street_name": "Name of the street",
-                    "cross_street_1": "First cross street",
-                    "cross_street_2": "Second cross street",
-                    "intersection_street_1": "First intersection street",
-                    "intersection_street_2": "Second intersection street",
-                    "address_type": "Type of address",
-                    "city": "City name",
-                    "landmark": "Nearby landmark",
-                    "facility_type": "Type of facility",
-                    "status": "Current status of the request",
-                    "due_date": "Due date for resolution",
-                    "resolution_description": "Description of resolution",
-                    "resolution_action_updated_date": "Date resolution was updated",
-                    "community_board": "Community board identifier",
-                    "bbl": "Borough, Block, and Lot number",
-                    "borough": "NYC borough name",
-                    "x_coordinate_state_plane": "X coordinate (State Plane)",
-                    "y_coordinate_state_plane": "Y coordinate (State Plane)",
-                    "open_data_channel_type": "Channel used to submit request",
-                    "park_facility_name": "Name of park facility",
-                    "park_borough": "Borough of the park",
-                    "vehicle_type": "Type of vehicle involved",
-                    "taxi_company_borough": "Borough of taxi company",
-                    "taxi_pick_up_location": "Taxi pickup location",
-                    "bridge_highway_name": "Name of bridge or highway",
-                    "bridge_highway_direction": "Direction on bridge/highway",
-                    "road_ramp": "Road ramp information",
-                    "bridge_highway_segment": "Bridge/highway segment",
-                    "latitude": "Latitude coordinate",
-                    "longitude": "Longitude coordinate",
-                    "location": "Combined location information",
-                }
-
-                # Add comments to existing columns
-                for column_name, comment in column_comments.items():
-                    with contextlib.suppress(Exception):
-                        # Skip if column doesn't exist in this dataset
-                        self.db.execute(f"""
-                            COMMENT ON COLUMN service_requests.{column_name} IS '{comment}';
-                        """)
+                # Create the table and all of its comments in a single transaction
+                self.db.begin()
+                try:
+                    self._create_service_requests(service_requests_file)
+                    self._add_service_requests_comments()
+                except Exception:
+                    self.db.rollback()
+                    raise
+                self.db.commit()
 
         except Exception as e:
             raise DatabaseError(f"Failed to initialize tables: {e}") from e
+
+    def _create_service_requests(self, service_requests_file: Path) -> None:
+        """Create the service_requests table or view over the parquet file."""
+        if self.materialize:
+            # Copy the whole parquet file into a DuckDB table
+            self.db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS service_requests AS
+                SELECT * FROM read_parquet(?);
+                """,
+                [str(service_requests_file)],
+            )
+        else:
+            # Query the parquet file lazily so only the columns and
+            # row groups a query touches are ever decoded. View
+            # definitions cannot take bound parameters, so the path
+            # is embedded as an escaped string literal instead.
+            parquet_path = str(service_requests_file).replace("'", "''")
+            self.db.execute(f"""
+                CREATE OR REPLACE VIEW service_requests AS
+                SELECT * FROM read_parquet('{parquet_path}');
+            """)
+
+    def _add_service_requests_comments(self) -> None:
+        """Add the table comment and comments for the columns in the dataset."""
+        # Add table comment
+        self.db.execute("""
+            COMMENT ON TABLE service_requests IS 'NYC 311 Service Requests data for 2024 containing complaint information, locations, agencies, and resolution details';
+        """)
+
+        # Add column comments
+        column_comments = {
+            "unique_key": "Unique identifier for each service request",
+            "created_date": "Date/time the request was created",
+            "closed_date": "Date/time the request was closed",
+            "agency": "The agency responsible for the request",
+            "agency_name": "Full name of the responsible agency",
+            "complaint_type": "Type of complaint/request",
+            "descriptor": "Detailed description of the issue",
+            "location_type": "Type of location where issue occurred",
+            "incident_zip": "ZIP code of the incident",
+            "incident_address": "Street address of the incident",
+            "street_name": "Name of the street",
+            "cross_street_1": "First cross street",
+            "cross_street_2": "Second cross street",
+            "intersection_street_1": "First intersection street",
+            "intersection_street_2": "Second intersection street",
+            "address_type": "Type of address",
+            "city": "City name",
+            "landmark": "Nearby landmark",
+            "facility_type": "Type of facility",
+            "status": "Current status of the request",
+            "due_date": "Due date for resolution",
+            "resolution_description": "Description of resolution",
+            "resolution_action_updated_date": "Date resolution was updated",
+            "community_board": "Community board identifier",
+            "bbl": "Borough, Block, and Lot number",
+            "borough": "NYC borough name",
+            "x_coordinate_state_plane": "X coordinate (State Plane)",
+            "y_coordinate_state_plane": "Y coordinate (State Plane)",
+            "open_data_channel_type": "Channel used to submit request",
+            "park_facility_name": "Name of park facility",
+            "park_borough": "Borough of the park",
+            "vehicle_type": "Type of vehicle involved",
+            "taxi_company_borough": "Borough of taxi company",
+            "taxi_pick_up_location": "Taxi pickup location",
+            "bridge_highway_name": "Name of bridge or highway",
+            "bridge_highway_direction": "Direction on bridge/highway",
+            "road_ramp": "Road ramp information",
+            "bridge_highway_segment": "Bridge/highway segment",
+            "latitude": "Latitude coordinate",
+            "longitude": "Longitude coordinate",
+            "location": "Combined location information",
+        }
+
+        # Add comments to the columns present in this dataset in one batch
+        existing_columns = {
+            row[0]
+            for row in self.db.execute("""
+                SELECT column_name
+                FROM duckdb_columns()
+                WHERE table_name = 'service_requests'
+            """).fetchall()
+        }
+        comment_statements = [
+            f"COMMENT ON COLUMN service_requests.{column_name} IS "
+            f"'{comment.replace("'", "''")}';"
+            for column_name, comment in column_comments.items()
+            if column_name in existing_columns
+        ]
+        if comment_statements:
+            self.db.execute("\n".join(comment_statements))
@@ -2,17 +2,59 @@
 MCP server setup and tools for the NYC 311 Data MCP Server.
 """
 
+import base64
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
-from typing import Any
+from typing import TYPE_CHECKING, Any, Literal
 
-import duckdb
-
-from .config import LoggerConfig
-from .database import DatabaseManager
+from .config import LoggerConfig, default_config
 from .exceptions import DatabaseError, ValidationError
 from .models import AppContext
 
+if TYPE_CHECKING:
+    import duckdb
+    import pyarrow
+
+
+def _configure_connection(db: "duckdb.DuckDBPyConnection", logger) -> None:
+    """Apply the configured DuckDB performance settings to a new connection."""
+    import duckdb
+
+    settings: list[tuple[str, Any]] = [
+        ("threads", default_config.duckdb_threads),
+        ("memory_limit", default_config.duckdb_memory_limit),
+        ("enable_object_cache", default_config.duckdb_enable_object_cache),
+        (
+            "enable_external_file_cache",
+            default_config.duckdb_enable_external_file_cache,
+        ),
+    ]
+    for name, value in settings:
+        if value is None:
+            continue
+        try:
+            db.execute(f"SET {name} = ?", [value])
+        except duckdb.Error as e:
+            # Older DuckDB versions do not know every setting
+            logger.info(f"Skipping unsupported DuckDB setting {name}: {e}")
+
+
+def _serialize_arrow_table(table: "pyarrow.Table") -> str:
+    """Serialize an Arrow table as a base64 Arrow IPC stream."""
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return base64.b64encode(sink.getvalue().to_pybytes()).decode("ascii")
+
+
+def _serialize_columns(columns: dict[str, list[Any]]) -> str:
+    """Serialize column value lists as JSON, encoding values like FastMCP rows."""
+    import pydantic_core
+
+    return pydantic_core.to_json(columns, fallback=str).decode()
+
 
 def create_mcp_server(data_dir, log_file):
     """Factory function to create and configure the MCP server."""
@@ -24,14 +66,31 @@ def create_mcp_server(data_dir, log_file):
     @asynccontextmanager
     async def app_lifespan(server) -> AsyncIterator[AppContext]:
         """Manage application lifecycle with proper resource cleanup."""
+        import duckdb
+
         db = None
         try:
+            database_file = None
+            if default_config.use_native_database:
+                database_file = AppContext.build_database_file(data_dir, logger)
+
             # Initialize database connection
             logger.info("Initializing database connection")
-            db = duckdb.connect(database=":memory:", read_only=False)
+            if database_file:
+                db = duckdb.connect(database=str(database_file), read_only=True)
+            else:
+                db = duckdb.connect(database=":memory:", read_only=False)
+            _configure_connection(db, logger)
 
             # Create and yield context
-            context = AppContext(db=db, data_dir=data_dir)
+            context = AppContext(
+                db=db,
+                data_dir=data_dir,
+                logger=logger,
+                materialize=default_config.materialize_tables,
+                preloaded=database_file is not None,
+                config=default_config,
+            )
             logger.info("Application context created successfully")
             yield context
 
@@ -53,7 +112,9 @@ def create_mcp_server(data_dir, log_file):
     )
 
     @mcp.tool()
-    async def query_data(sql: str, ctx=None) -> list[dict[str, Any]]:
+    async def query_data(
+        sql: str, format: Literal["rows", "json", "arrow"] = "rows", ctx=None
+    ) -> list[dict[str, Any]] | str:
         """
         Query the NYC 311 service requests data using a SQL query.
 
@@ -68,11 +129,16 @@ def create_mcp_server(data_dir, log_file):
 
         Args:
             sql: A SELECT SQL query string (other operations are forbidden)
+            format: "rows" (default) returns a list of row dictionaries. "json"
+                returns a JSON object mapping each column name to its list of
+                values, and "arrow" returns a base64-encoded Arrow IPC stream.
+                Prefer "json" or "arrow" for results over ~1000 rows.
             ctx: FastMCP context for logging and notifications
 
         Returns:
             The result of the SQL query as a list of dictionaries, where each dictionary
-            represents a row with column names as keys.
+            represents a row with column names as keys, or a string in the
+            requested columnar format.
 
         Raises:
             ValidationError: If the SQL query is invalid or contains forbidden operations
@@ -86,9 +152,7 @@ def create_mcp_server(data_dir, log_file):
                 await ctx.info("Processing SQL query request")
 
             app_context = mcp.get_context()
-            db_manager = DatabaseManager(
-                app_context.request_context.lifespan_context.db, logger
-            )
+            db_manager = app_context.request_context.lifespan_context.db_manager
 
             # Validate query before execution
             db_manager.validate_sql_query(sql)
@@ -99,8 +163,32 @@ def create_mcp_server(data_dir, log_file):
                     0.3, 1.0, "Validation complete, executing query..."
                 )
 
-            # Execute the query
-            result = db_manager.execute_query(sql)
+            if format != "rows":
+                # Serialize the columnar result directly, without row dictionaries
+                if format == "arrow":
+                    table = db_manager.execute_query_arrow(sql)
+                    row_count = table.num_rows
+                    serialized = _serialize_arrow_table(table)
+                else:
+                    columns = db_manager.execute_query_columns(sql)
+                    row_count = len(next(iter(columns.values()), []))
+                    serialized = _serialize_columns(columns)
+                if ctx:
+                    await ctx.info(
+                        f"Query completed successfully with {row_count} rows"
+                    )
+                    await ctx.report_progress(1.0, 1.0, "Results ready")
+                return serialized
+
+            # Execute the query, streaming chunks of rows so progress can be
+            # reported while large results are still being fetched
+            result = []
+            for chunk in db_manager.execute_query_streaming(sql):
+                result.extend(chunk)
+                if ctx and len(chunk) == db_manager.STREAM_CHUNK_SIZE:
+                    await ctx.report_progress(
+                        0.6, 1.0, f"Fetched {len(result):,} rows so far..."
+                    )
 
             if ctx:
                 await ctx.report_progress(
@@ -132,9 +220,7 @@ def create_mcp_server(data_dir, log_file):
         """
         try:
             app_context = mcp.get_context()
-            db = app_context.request_context.lifespan_context.db
-            db_manager = DatabaseManager(db, logger)
-            return db_manager.get_schema_info()
+            return app_context.request_context.lifespan_context.get_schema_info()
         except Exception as e:
             logger.error(f"Failed to get schema: {e}")
             return f"Error retrieving schema: {e}"
@@ -154,10 +240,7 @@ def create_mcp_server(data_dir, log_file):
                 await ctx.info("Retrieving table schema information")
 
             app_context = mcp.get_context()
-            db = app_context.request_context.lifespan_context.db
-            db_manager = DatabaseManager(db, logger)
-
-            return db_manager.get_schema_info()
+            return app_context.request_context.lifespan_context.get_schema_info()
         except Exception as e:
             logger.error(f"Failed to get schema via tool: {e}")
             if ctx:
@@ -2,24 +2,63 @@
 Unit tests for the NYC 311 Data MCP Server.
 """
 
+import base64
+import json
+import logging
+import logging.handlers
 import tempfile
+from datetime import timedelta
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import duckdb
+import pyarrow as pa
+import pydantic_core
 import pytest
 
-from .config import LoggerConfig
-from .database import DatabaseManager
+from .config import LoggerConfig, ServerConfig
+from .database import SCHEMA_ERROR_MESSAGE, DatabaseManager
 from .exceptions import DatabaseError, ValidationError
 from .models import AppContext
-from .server import create_mcp_server
+from .server import (
+    _configure_connection,
+    _serialize_arrow_table,
+    _serialize_columns,
+    create_mcp_server,
+)
+
+# SQL validation cases, one parametrized test per query
+VALID_QUERIES = [
+    "SELECT * FROM table LIMIT 10",
+    "SELECT col1, col2 FROM table",
+    "   select col1, col2 from table   ",
+    "SELECT created_date, resolution_action_updated_date FROM table",
+    "-- top boroughs\nSELECT borough FROM table",
+    "/* recent */ WITH t AS (SELECT 1 AS a) SELECT a FROM t",
+]
+
+INVALID_QUERY_CASES = [
+    ("", "SQL query cannot be empty"),
+    ("   ", "SQL query cannot be empty"),
+    ("SHOW TABLES", "Only SELECT queries are allowed"),
+    ("SELECT * FROM table", "SELECT \\* queries must include a LIMIT clause"),
+    ("DROP TABLE test", "forbidden keyword"),
+    ("UPDATE table SET col=1", "forbidden keyword"),
+    ("SELECT col1 FROM table -- DROP TABLE test", "forbidden keyword"),
+    ("select 1; drop table test", "forbidden keyword: DROP"),
+    ("SELECT 1; EXECUTE stmt", "forbidden keyword: EXECUTE$"),
+    ("PRAGMA database_list", "forbidden keyword: PRAGMA"),
+    ("-- just a comment", "Only SELECT queries are allowed"),
+    ("SELECTION FROM table", "Only SELECT queries are allowed"),
+    ("/* unterminated SELECT 1", "Only SELECT queries are allowed"),
+]
 
 
 class TestLoggerConfig:
     """Test cases for LoggerConfig class."""
 
     def test_setup_logger_creates_logger_with_handlers(self):
-        """Test that setup_logger creates a logger with file and console handlers."""
+        """Test that setup_logger queues records to file and console handlers."""
         with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
             log_path = Path(tmp_file.name)
 
@@ -27,8 +66,16 @@ class TestLoggerConfig:
             logger = LoggerConfig.setup_logger("test_logger", log_path)
 
             assert logger.name == "test_logger"
-            assert len(logger.handlers) == 2  # file + console
+            assert len(logger.handlers) == 1
+            queue_handler = logger.handlers[0]
+            assert isinstance(queue_handler, logging.handlers.QueueHandler)
+            assert len(queue_handler.listener.handlers) == 2  # file + console
             assert not logger.propagate
+
+            # Records are written to the log file by the background listener
+            logger.info("queued message")
+            queue_handler.listener.stop()
+            assert "queued message" in log_path.read_text(encoding="utf-8")
         finally:
             log_path.unlink(missing_ok=True)
 
@@ -38,15 +85,33 @@ class TestDatabaseManager:
 
     def setup_method(self):
         """Set up test fixtures."""
-        self.mock_db = Mock()
-        self.mock_logger = Mock()
+        self.mock_db = Mock(spec=duckdb.DuckDBPyConnection)
+        self.mock_cursor = self.mock_db.cursor.return_value
+        self.mock_db.extract_statements.side_effect = lambda query: [query]
+        self.mock_logger = Mock(spec=logging.Logger)
         self.db_manager = DatabaseManager(self.mock_db, self.mock_logger)
 
+    def _mock_result(self, columns: list[str], rows: list[tuple]) -> None:
+        """Make every execute on the mock cursor return the given rows."""
+        self.mock_cursor.description = [(name,) for name in columns]
+        pending: list[tuple] = []
+
+        def execute(*args):
+            pending[:] = rows
+            return self.mock_cursor
+
+        def fetchmany(size):
+            chunk = pending[:size]
+            del pending[:size]
+            return chunk
+
+        self.mock_cursor.execute.side_effect = execute
+        self.mock_cursor.fetchmany.side_effect = fetchmany
+
     def test_execute_query_success_with_performance_logging(self):
         """Test successful query execution and performance logging."""
         # Mock database response
-        self.mock_db.execute.return_value.fetchall.return_value = [("cat1",), ("cat2",)]
-        self.mock_db.description = [("category",)]
+        self._mock_result(["category"], [("cat1",), ("cat2",)])
 
         result = self.db_manager.execute_query("SELECT * FROM test")
 
@@ -55,73 +120,151 @@ class TestDatabaseManager:
 
         # Verify logging was called
         self.mock_logger.info.assert_called()
+        debug_calls = [call.args[0] for call in self.mock_logger.debug.call_args_list]
+        assert any("Executing query" in msg for msg in debug_calls)
 
-        # Check that performance metrics were logged
-        info_calls = [call.args[0] for call in self.mock_logger.info.call_args_list]
-        assert any("Executing query" in msg for msg in info_calls)
-        assert any("Query executed successfully" in msg for msg in info_calls)
-
-        # Check that execution time was logged in success call
+        # Check that performance metrics were logged in the success call
         success_call = next(
             call
             for call in self.mock_logger.info.call_args_list
-            if call.args[0] == "Query executed successfully"
+            if call.args[0].startswith("Query executed successfully")
         )
-        assert "execution_time_ms" in success_call.kwargs["extra"]
-        assert "row_count" in success_call.kwargs["extra"]
+        row_count, column_count, execution_time_ms = success_call.args[1:]
+        assert row_count == 2
+        assert column_count == 1
+        assert execution_time_ms >= 0
 
     def test_execute_query_with_params(self):
         """Test query execution with parameters."""
-        self.mock_db.execute.return_value.fetchall.return_value = []
-        self.mock_db.description = []
+        self._mock_result([], [])
 
         params = {"table": "test_table"}
         self.db_manager.execute_query("SELECT * FROM ?", params)
 
-        self.mock_db.execute.assert_called_with("SELECT * FROM ?", params)
+        self.mock_cursor.execute.assert_called_with("SELECT * FROM ?", params)
+
+    def test_execute_query_streaming_yields_chunks(self):
+        """Test that results are streamed chunk_size rows at a time."""
+        self._mock_result(["n"], [(n,) for n in range(5)])
+
+        chunks = list(
+            self.db_manager.execute_query_streaming("SELECT n FROM t", None, 2)
+        )
+
+        assert chunks == [
+            [{"n": 0}, {"n": 1}],
+            [{"n": 2}, {"n": 3}],
+            [{"n": 4}],
+        ]
+        self.mock_cursor.fetchmany.assert_called_with(2)
+        self.mock_cursor.close.assert_called_once()
+
+    def test_execute_query_caches_repeated_queries(self):
+        """Test that identical queries are served from the result cache."""
+        self._mock_result(["category"], [("cat1",)])
+
+        first = self.db_manager.execute_query("SELECT category FROM test")
+        second = self.db_manager.execute_query("  SELECT category FROM test\n")
+
+        assert first == second == [{"category": "cat1"}]
+        assert self.mock_cursor.execute.call_count == 1
+
+        # Different parameters must not share a cache entry
+        self.db_manager.execute_query("SELECT category FROM test", {"x": 1})
+        assert self.mock_cursor.execute.call_count == 2
+
+    def test_execute_query_empty_result(self):
+        """Test that an empty result yields no chunks and an empty list."""
+        self._mock_result(["category"], [])
+
+        assert list(self.db_manager.execute_query_streaming("SELECT 1")) == []
+        assert self.db_manager.execute_query("SELECT 2") == []
+
+    def test_execute_query_reuses_parsed_statements(self):
+        """Test that a query is parsed once and the parsed statement reused."""
+        self._mock_result(["n"], [(1,)])
+
+        self.db_manager.execute_query("SELECT $n AS n", {"n": 1})
+        self.db_manager.execute_query("SELECT $n AS n", {"n": 2})
+
+        self.mock_db.extract_statements.assert_called_once_with("SELECT $n AS n")
+        assert self.mock_cursor.execute.call_count == 2
 
     def test_execute_query_database_error(self):
         """Test query execution failure."""
-        self.mock_db.execute.side_effect = Exception("DB Error")
+        self.mock_cursor.execute.side_effect = Exception("DB Error")
 
         with pytest.raises(DatabaseError, match="Query execution failed"):
             self.db_manager.execute_query("SELECT * FROM test")
 
-    def test_sql_validation_comprehensive(self):
-        """Comprehensive test of SQL validation rules."""
-        # Valid queries should pass
-        valid_queries = [
-            "SELECT * FROM table LIMIT 10",
-            "SELECT col1, col2 FROM table",
-            "   select col1, col2 from table   ",
-        ]
-        for query in valid_queries:
-            self.db_manager.validate_sql_query(query)  # Should not raise
-
-        # Invalid queries should fail
-        invalid_cases = [
-            ("", "SQL query cannot be empty"),
-            ("   ", "SQL query cannot be empty"),
-            ("SHOW TABLES", "Only SELECT queries are allowed"),
-            ("SELECT * FROM table", "SELECT \\* queries must include a LIMIT clause"),
-            ("DROP TABLE test", "forbidden keyword"),
-            ("UPDATE table SET col=1", "forbidden keyword"),
-            ("SELECT col1 FROM table -- DROP TABLE test", "forbidden keyword"),
+    def test_execute_query_keeps_duckdb_value_types(self):
+        """Test that rows hold the same Python values as DuckDB's fetchall()."""
+        db = duckdb.connect()
+        try:
+            result = DatabaseManager(db, self.mock_logger).execute_query(
+                "SELECT SUM(range) AS total, INTERVAL 0 SECOND AS wait, "
+                "MAP {'a': 1} AS counts FROM range(1000)"
+            )
+        finally:
+            db.close()
+
+        # HUGEINT sums stay ints, intervals timedeltas and maps dicts
+        assert result == [{"total": 499500, "wait": timedelta(0), "counts": {"a": 1}}]
+        assert type(result[0]["total"]) is int
+        assert pydantic_core.to_json(result) == (
+            b'[{"total":499500,"wait":"PT0S","counts":{"a":1}}]'
+        )
+
+    def test_basic_schema_info_is_built_once(self):
+        """Test that the fallback schema text is cached after the first call."""
+        self.mock_db.execute.return_value.fetchall.return_value = [
+            ("unique_key", "BIGINT", "YES"),
         ]
 
-        for query, expected_error in invalid_cases:
-            with pytest.raises(ValidationError, match=expected_error):
-                self.db_manager.validate_sql_query(query)
+        first = self.db_manager._get_basic_schema_info()
+        second = self.db_manager._get_basic_schema_info()
+
+        assert first == second
+        assert "- unique_key: BIGINT (nullable)" in first
+        assert self.mock_db.execute.call_count == 1
+
+    def test_basic_schema_info_without_columns(self):
+        """Test that a missing table returns the schema error message."""
+        self.mock_db.execute.return_value.fetchall.return_value = []
+
+        assert self.db_manager._get_basic_schema_info() == SCHEMA_ERROR_MESSAGE
+
+    @pytest.mark.parametrize("query", VALID_QUERIES)
+    def test_sql_validation_accepts_valid_queries(self, query):
+        """Test that allowed SELECT queries pass validation."""
+        self.db_manager.validate_sql_query(query)  # Should not raise
+
+    @pytest.mark.parametrize(("query", "expected_error"), INVALID_QUERY_CASES)
+    def test_sql_validation_rejects_invalid_queries(self, query, expected_error):
+        """Test that each SQL validation rule rejects offending queries."""
+        with pytest.raises(ValidationError, match=expected_error):
+            self.db_manager.validate_sql_query(query)
+
+    def test_sql_validation_uses_configured_keywords(self):
+        """Test that validation forbids the keywords of the given config."""
+        config = ServerConfig(forbidden_sql_keywords=("UNION",))
+        db_manager = DatabaseManager(self.mock_db, self.mock_logger, config)
+
+        with pytest.raises(ValidationError, match="forbidden keyword: UNION"):
+            db_manager.validate_sql_query("SELECT 1 UNION SELECT 2")
+        self.db_manager.validate_sql_query("SELECT 1 UNION SELECT 2")
 
 
 class TestAppContext:
     """Test cases for AppContext class."""
 
-    @patch("data_mcp.models.duckdb")
-    def test_app_context_initialization(self, mock_duckdb):
+    def test_app_context_initialization(self):
         """Test AppContext initialization and table setup."""
-        mock_db = Mock()
-        mock_duckdb.connect.return_value = mock_db
+        mock_db = Mock(spec=duckdb.DuckDBPyConnection)
+        mock_db.execute.return_value.fetchall.return_value = [
+            ("unique_key",),
+            ("created_date",),
+        ]
 
         with tempfile.TemporaryDirectory() as tmp_dir:
             data_dir = Path(tmp_dir)
@@ -132,15 +275,20 @@ class TestAppContext:
             parquet_file = cityofnewyork_dir / "service_requests_2024.parquet"
             parquet_file.touch()
 
-            AppContext(db=mock_db, data_dir=data_dir)
+            context = AppContext(db=mock_db, data_dir=data_dir)
+
+            # The shared database manager wraps the context connection
+            assert isinstance(context.db_manager, DatabaseManager)
+            assert context.db_manager.db is mock_db
 
             # Verify table initialization was attempted - should be multiple calls now
-            # (table creation + table comment + column comments)
+            # (view creation + table comment + column comments)
             assert mock_db.execute.call_count > 1
 
-            # Check that the first call was table creation
+            # Check that the first call created a view over the parquet file
             first_call_args = mock_db.execute.call_args_list[0][0][0]
-            assert "CREATE TABLE IF NOT EXISTS service_requests" in first_call_args
+            assert "CREATE OR REPLACE VIEW service_requests" in first_call_args
+            assert "read_parquet(" in first_call_args
 
             # Check that table comment was added
             calls = [call[0][0] for call in mock_db.execute.call_args_list]
@@ -153,7 +301,108 @@ class TestAppContext:
             column_comment_calls = [
                 call for call in calls if "COMMENT ON COLUMN service_requests." in call
             ]
-            assert len(column_comment_calls) > 0
+            assert len(column_comment_calls) == 1
+
+            # Only columns present in the dataset are commented, in a single batch
+            batch = column_comment_calls[0]
+            assert "service_requests.unique_key" in batch
+            assert "service_requests.created_date" in batch
+            assert "service_requests.borough" not in batch
+
+            # The table and comment DDL run in a single transaction
+            mock_db.begin.assert_called_once()
+            mock_db.commit.assert_called_once()
+            mock_db.rollback.assert_not_called()
+
+    def test_app_context_does_not_cache_schema_errors(self):
+        """Test that a failed schema lookup is retried on the next call."""
+        mock_db = Mock(spec=duckdb.DuckDBPyConnection)
+        mock_db.execute.side_effect = Exception("DB Error")
+
+        context = AppContext(
+            db=mock_db,
+            data_dir=Path("data"),
+            logger=Mock(spec=logging.Logger),
+            preloaded=True,
+        )
+        assert context.schema_cache is None
+        assert context.get_schema_info() == SCHEMA_ERROR_MESSAGE
+
+        mock_db.execute.side_effect = None
+        mock_db.execute.return_value.fetchall.return_value = [
+            ("unique_key", "BIGINT", "YES", "Unique identifier"),
+        ]
+        schema_info = context.get_schema_info()
+        assert "unique_key: BIGINT (nullable) - Unique identifier" in schema_info
+        assert context.schema_cache == schema_info
+
+    def test_app_context_materialize_creates_table(self):
+        """Test that materialize=True copies the parquet data into a table."""
+        mock_db = Mock(spec=duckdb.DuckDBPyConnection)
+        mock_db.execute.return_value.fetchall.return_value = []
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = Path(tmp_dir)
+            cityofnewyork_dir = data_dir / "cityofnewyork"
+            cityofnewyork_dir.mkdir()
+            (cityofnewyork_dir / "service_requests_2024.parquet").touch()
+
+            AppContext(db=mock_db, data_dir=data_dir, materialize=True)
+
+            first_call = mock_db.execute.call_args_list[0]
+            assert "CREATE TABLE IF NOT EXISTS service_requests" in first_call.args[0]
+            assert "read_parquet(?)" in first_call.args[0]
+            assert first_call.args[1] == [
+                str(cityofnewyork_dir / "service_requests_2024.parquet")
+            ]
+
+    def test_build_database_file_creates_native_database(self):
+        """Test that the parquet file is converted to a reusable DuckDB file."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_dir = Path(tmp_dir)
+            (data_dir / "cityofnewyork").mkdir()
+            parquet_file = data_dir / "cityofnewyork/service_requests_2024.parquet"
+            duckdb.execute(
+                f"COPY (SELECT 1::BIGINT AS unique_key, 'QUEENS' AS borough) "
+                f"TO '{parquet_file}' (FORMAT 'parquet')"
+            )
+
+            database_file = AppContext.build_database_file(
+                data_dir, Mock(spec=logging.Logger)
+            )
+            assert (
+                database_file == data_dir / "cityofnewyork/service_requests_2024.duckdb"
+            )
+            assert database_file.exists()
+
+            # A second call reuses the existing file
+            mtime = database_file.stat().st_mtime_ns
+            assert (
+                AppContext.build_database_file(data_dir, Mock(spec=logging.Logger))
+                == database_file
+            )
+            assert database_file.stat().st_mtime_ns == mtime
+
+            db = duckdb.connect(database=str(database_file), read_only=True)
+            try:
+                context = AppContext(db=db, data_dir=data_dir, preloaded=True)
+                rows = context.db_manager.execute_query(
+                    "SELECT borough FROM service_requests"
+                )
+                assert rows == [{"borough": "QUEENS"}]
+                # The schema is computed once at startup and served from the cache
+                assert "Unique identifier" in context.schema_cache
+                assert context.get_schema_info() is context.schema_cache
+            finally:
+                db.close()
+
+    def test_build_database_file_without_parquet(self):
+        """Test that no database file is built when the parquet data is missing."""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            assert (
+                AppContext.build_database_file(Path(tmp_dir), Mock(spec=logging.Logger))
+                is None
+            )
 
 
 @pytest.fixture
@@ -172,6 +421,69 @@ def mcp_server():
         log_file.unlink(missing_ok=True)
 
 
+class TestConnectionSettings:
+    """Test cases for DuckDB connection configuration."""
+
+    def test_configure_connection_applies_settings(self):
+        """Test that configured settings are applied and unknown ones skipped."""
+        db = duckdb.connect(database=":memory:")
+        try:
+            with patch("data_mcp.server.default_config") as config:
+                config.duckdb_threads = 2
+                config.duckdb_memory_limit = "1GB"
+                config.duckdb_enable_object_cache = True
+                config.duckdb_enable_external_file_cache = None
+                _configure_connection(db, Mock(spec=logging.Logger))
+
+            threads, memory_limit = db.execute(
+                "SELECT current_setting('threads'), current_setting('memory_limit')"
+            ).fetchone()
+            assert threads == 2
+            assert "GiB" in memory_limit or "MiB" in memory_limit
+        finally:
+            db.close()
+
+
+class TestResultSerialization:
+    """Test cases for columnar query result formats."""
+
+    def test_serialize_columns_as_json(self):
+        """Test that JSON output maps each column to its values."""
+        columns = {"borough": ["QUEENS", "BRONX"], "count": [3, 1]}
+
+        result = json.loads(_serialize_columns(columns))
+
+        assert result == {"borough": ["QUEENS", "BRONX"], "count": [3, 1]}
+
+    def test_serialize_columns_keeps_duckdb_value_types(self):
+        """Test that JSON columns encode sums, intervals and maps like rows do."""
+        db = duckdb.connect()
+        try:
+            columns = DatabaseManager(
+                db, Mock(spec=logging.Logger)
+            ).execute_query_columns(
+                "SELECT SUM(range) AS total, INTERVAL 0 SECOND AS wait, "
+                "MAP {'a': 1} AS counts FROM range(1000)"
+            )
+        finally:
+            db.close()
+
+        assert json.loads(_serialize_columns(columns)) == {
+            "total": [499500],
+            "wait": ["PT0S"],
+            "counts": [{"a": 1}],
+        }
+
+    def test_serialize_arrow_table_as_arrow_ipc(self):
+        """Test that Arrow output is a base64 IPC stream that round-trips."""
+        table = pa.table({"borough": ["QUEENS", "BRONX"], "count": [3, 1]})
+
+        encoded = _serialize_arrow_table(table)
+        decoded = pa.ipc.open_stream(base64.b64decode(encoded)).read_all()
+
+        assert decoded.equals(table)
+
+
 class TestMCPServer:
     """Integration tests for MCP server functionality."""
 
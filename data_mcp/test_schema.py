@@ -23,33 +23,36 @@ except ImportError:
     from models import AppContext
 
 
-class TestSchemaComments:
-    """Test suite for schema comment functionality."""
+@pytest.fixture(scope="class")
+def logger():
+    """Create a test logger."""
+    with tempfile.NamedTemporaryFile(suffix=".log", delete=False) as tmp_log:
+        log_file = Path(tmp_log.name)
 
-    @pytest.fixture
-    def logger(self):
-        """Create a test logger."""
-        with tempfile.NamedTemporaryFile(suffix=".log", delete=False) as tmp_log:
-            log_file = Path(tmp_log.name)
+    try:
+        logger_instance = LoggerConfig.setup_logger(__name__, log_file)
+        yield logger_instance
+    finally:
+        log_file.unlink(missing_ok=True)
 
-        try:
-            logger_instance = LoggerConfig.setup_logger(__name__, log_file)
-            yield logger_instance
-        finally:
-            log_file.unlink(missing_ok=True)
 
-    @pytest.fixture
-    def data_dir(self):
-        """Create test data directory path."""
-        return Path(__file__).parent.parent / "data"
+@pytest.fixture(scope="class")
+def data_dir():
+    """Create test data directory path."""
+    return Path(__file__).parent.parent / "data"
 
-    @pytest.fixture
-    def db_context(self, data_dir):
-        """Create database context with test data."""
-        db = duckdb.connect(database=":memory:", read_only=False)
-        context = AppContext(db=db, data_dir=data_dir)
-        yield db, context
-        db.close()
+
+@pytest.fixture(scope="class")
+def db_context(data_dir):
+    """Create database context with test data, shared by the read-only tests."""
+    db = duckdb.connect(database=":memory:", read_only=False)
+    context = AppContext(db=db, data_dir=data_dir)
+    yield db, context
+    db.close()
+
+
+class TestSchemaComments:
+    """Test suite for schema comment functionality."""
 
     def test_schema_with_comments(self, logger, db_context):
         """Test that schema information includes comments from database metadata."""
@@ -41,8 +41,15 @@ if not os.path.exists(modzcta_csv_file):
         "wget https://data.cityofnewyork.us/api/views/pri4-ifjk/rows.csv -O {modzcta_csv_file}"
     )
 
+# Parquet writer options for the service request files
+# ZSTD decompresses faster than the default Snappy at a better ratio, and row
+# groups are sized to DuckDB's default vector batching (120 * 2048 rows)
+parquet_options = "FORMAT 'parquet', COMPRESSION 'zstd', ROW_GROUP_SIZE 122880"
+
 # Connect to DuckDB
 con = duckdb.connect(database=":memory:", read_only=False)
+con.execute(f"SET threads = {os.cpu_count()}")
+con.execute("SET enable_progress_bar = false")
 
 # Create parquet file if it doesn't exist
 if not os.path.exists(service_requests_parquet_file):
@@ -95,7 +102,7 @@ if not os.path.exists(service_requests_parquet_file):
                     'longitude': 'DOUBLE',
                     'location': 'VARCHAR'
                 }})) 
-            TO "{service_requests_parquet_file}" (FORMAT 'parquet');
+            TO "{service_requests_parquet_file}" ({parquet_options});
         """)
         print(
             f"Exported {service_requests_csv_file} to {service_requests_parquet_file} successfully."
@@ -126,12 +133,14 @@ if not os.path.exists(modzcta_parquet_file):
 # Create parquet file for 2024 if it doesn't exist
 if not os.path.exists(service_requests_parquet_file_2024):
     try:
-        # Execute the SQL to read CSV and write to Parquet
+        # Rows are ordered by created_date so each row group covers a narrow
+        # date range, letting readers skip row groups on date filters
         con.execute(f"""
             COPY (
                 FROM "{service_requests_parquet_file}"
                 WHERE created_date between '2024-01-01' and '2024-12-31'
-            ) TO "{service_requests_parquet_file_2024}";
+                ORDER BY created_date
+            ) TO "{service_requests_parquet_file_2024}" ({parquet_options});
         """)
         print(
             f"Exported {service_requests_parquet_file} to {service_requests_parquet_file_2024} successfully."
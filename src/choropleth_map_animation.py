@@ -1,10 +1,15 @@
+import contextlib
+import os
+from pathlib import Path
+
 import cartopy.crs as ccrs
 import geopandas as gpd
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from shapely import wkt
+import pyarrow.csv as pacsv
+import shapely
 
 from src.map_animation_base import MapAnimationBase
 
@@ -22,11 +27,16 @@ class ChoroplethMapAnimation(MapAnimationBase):
         date_field: str,
         label: str,
         output_path: str = "./output/",
+        render_dpi: int | None = None,
     ) -> None:
         if not shapefile_path:
             raise ValueError("shapefile_path is required")
 
         self.gdf = self._load_shapefile(shapefile_path)
+        self.polygon_coords, self.polygon_offsets, self.polygon_rows = (
+            self._extract_polygons()
+        )
+        self._setup_population()
         self._bounds = None
 
         super().__init__(
@@ -34,72 +44,106 @@ class ChoroplethMapAnimation(MapAnimationBase):
             date_field=date_field,
             label=label,
             output_path=output_path,
+            render_dpi=render_dpi,
         )
 
     def _load_shapefile(self, path: str) -> gpd.GeoDataFrame:
+        # Parsed geometries are cached next to the CSV until it changes
+        cache_path = Path(f"{path}.parquet")
+        try:
+            if cache_path.stat().st_mtime >= Path(path).stat().st_mtime:
+                return gpd.read_parquet(cache_path)
+        except Exception:
+            # A missing, stale or unreadable cache is rebuilt from the CSV
+            pass
+
         try:
-            shape_df = pd.read_csv(path)
-            if "the_geom" not in shape_df.columns:
+            # pyarrow parses the long WKT strings with multiple threads
+            table = pacsv.read_csv(path)
+            if "the_geom" not in table.column_names:
                 raise ValueError("Shapefile must contain 'the_geom' column")
-            if "MODZCTA" not in shape_df.columns:
+            if "MODZCTA" not in table.column_names:
                 raise ValueError("Shapefile must contain 'MODZCTA' column")
-            if "pop_est" not in shape_df.columns:
+            if "pop_est" not in table.column_names:
                 raise ValueError("Shapefile must contain 'pop_est' column")
 
-            shape_df["geometry"] = shape_df["the_geom"].apply(wkt.loads)
-            return gpd.GeoDataFrame(shape_df, geometry="geometry")
+            geometry = shapely.from_wkt(
+                table["the_geom"].to_numpy(zero_copy_only=False)
+            )
+            gdf = gpd.GeoDataFrame(table.to_pandas(), geometry=geometry)
         except Exception as e:
             raise ValueError(f"Failed to load shapefile: {str(e)}") from e
 
-    def _calculate_zipcode_density(self, data: pd.DataFrame) -> pd.Series:
-        if not len(data):
-            return pd.Series(0, index=self.gdf["MODZCTA"].astype(str))
+        self._write_shapefile_cache(gdf, cache_path)
+        return gdf
 
-        density = data.groupby("MODZCTA").size().reset_index(name="count")
-        density["MODZCTA"] = density["MODZCTA"].astype(str)
+    @staticmethod
+    def _write_shapefile_cache(gdf: gpd.GeoDataFrame, cache_path: Path) -> None:
+        # Written to a temporary file first so an interrupted run never leaves
+        # a truncated cache behind
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+        try:
+            gdf.to_parquet(tmp_path)
+            tmp_path.replace(cache_path)
+        except Exception:
+            # The cache is only an optimization, so a read-only directory is fine
+            with contextlib.suppress(OSError):
+                tmp_path.unlink(missing_ok=True)
+
+    def _extract_polygons(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Exterior vertices of all polygons, their offsets and their ZIP code rows"""
+        # Explode multipolygons and collect all ring coordinates in bulk
+        polygons, rows = shapely.get_parts(
+            self.gdf.geometry.to_numpy(), return_index=True
+        )
+        rings = shapely.get_exterior_ring(polygons)
+        coords = shapely.get_coordinates(rings).astype(np.float32)
 
-        # Create full data series with zeros for missing ZIP codes
-        full_data = pd.Series(0, index=self.gdf["MODZCTA"].astype(str))
-        full_data.update(density.set_index("MODZCTA")["count"])
+        offsets = np.concatenate([[0], np.cumsum(shapely.get_num_coordinates(rings))])
+        return coords, offsets, rows
+
+    def _setup_population(self) -> None:
+        """Cache the ZIP code categories and per-10000-resident scale factors"""
+        self.zip_codes = pd.CategoricalDtype(self.gdf["MODZCTA"].astype(str))
+        with np.errstate(divide="ignore"):
+            self.per_10k_residents = 10000 / self.gdf["pop_est"].to_numpy(dtype=float)
+
+    def _calculate_zipcode_density(self, data: pd.DataFrame) -> np.ndarray:
+        if not len(data):
+            return np.zeros(len(self.gdf))
+
+        # ZIP codes outside the shapefile get code -1 and are not counted
+        codes = pd.Categorical(data["MODZCTA"], dtype=self.zip_codes).codes
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.gdf))
 
         # Normalize by population
-        population = self.gdf.set_index("MODZCTA")["pop_est"].astype(float)
-        population.index = population.index.astype(str)
-        return (full_data / population) * 10000
+        return counts * self.per_10k_residents
 
-    def _calculate_timeframe_density(self, data: pd.DataFrame) -> pd.DataFrame:
+    def _calculate_timeframe_density(
+        self, timeframe: int, data: pd.DataFrame
+    ) -> np.ndarray:
         return self._calculate_zipcode_density(data)
 
-    def _plot_frame(self, ax: plt.Axes, data: pd.DataFrame) -> None:
-        density = self._calculate_zipcode_density(data)
-        patches: list[plt.Polygon] = []
-        values: list[float] = []
-
-        for geometry, value in zip(self.gdf.geometry, density, strict=False):
-            if hasattr(geometry, "geoms"):
-                for poly in geometry.geoms:
-                    patches.append(
-                        plt.Polygon(np.array(poly.exterior.coords), closed=True)
-                    )
-                    values.append(value)
-            else:
-                patches.append(
-                    plt.Polygon(np.array(geometry.exterior.coords), closed=True)
-                )
-                values.append(value)
-
-        collection = mpl.collections.PatchCollection(
-            patches,
+    def _setup_frame_artists(self, ax: plt.Axes) -> None:
+        # The polygons are the same for every frame, only the values change.
+        # They are views into the one vertex buffer, which is all that gets
+        # sent to the frame worker processes.
+        vertices = np.split(self.polygon_coords, self.polygon_offsets[1:-1])
+        collection = mpl.collections.PolyCollection(
+            vertices,
             cmap=self.cmap,
             alpha=self.ALPHA,
             edgecolor="black",
             linewidth=0.1,
             transform=ccrs.PlateCarree(),
         )
-
-        collection.set_array(np.array(values))
         collection.set_clim(vmin=self.VMIN, vmax=self.VMAX)
-        ax.add_collection(collection)
+        self.collection = ax.add_collection(collection)
+
+    def _plot_frame(self, ax: plt.Axes, timeframe: int) -> list[plt.Artist]:
+        density = self.frame_densities[timeframe]
+        self.collection.set_array(density[self.polygon_rows])
+        return [self.collection]
 
     def _add_colorbar(self, cbar_ax: plt.Axes) -> None:
         fig = cbar_ax.figure
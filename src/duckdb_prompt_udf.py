@@ -1,15 +1,75 @@
 # This file contains the UDF for calling the local LLM API.
 # Register the Python function as a scalar UDF
 # con.create_function("prompt", prompt, [str, str, str, float], str)
+# or, to send each chunk of rows to the LLM concurrently, as a vectorized UDF
+# con.create_function("prompt", prompt_batch, [str, str, str, float], str, type="arrow")
 
+import functools
+import hashlib
 import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import pyarrow as pa
 import requests
+from requests.adapters import HTTPAdapter
 
 MODEL = "gemma-3-27b-it"
 MODEL_TEMP = 0.4
 MODEL_MAX_TOKENS = -1
 
+# Maximum number of requests in flight to the LLM server at once
+MAX_CONCURRENT_REQUESTS = 8
+
+# Shared session so connections to the LLM server are kept alive and reused
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(pool_maxsize=MAX_CONCURRENT_REQUESTS))
+
+# On-disk cache of LLM responses, so identical prompts are reused across runs
+CACHE_FILE = ".llm_cache.sqlite"
+_cache_lock = threading.Lock()
+_cache_db: sqlite3.Connection | None = None
+
+
+def _cache() -> sqlite3.Connection:
+    """
+    Opens the response cache on first use.
+    """
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        _cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key BLOB PRIMARY KEY, response TEXT)"
+        )
+    return _cache_db
+
+
+def _cache_get(key: bytes) -> str | None:
+    with _cache_lock:
+        row = (
+            _cache()
+            .execute("SELECT response FROM responses WHERE key = ?", (key,))
+            .fetchone()
+        )
+    return row[0] if row else None
+
+
+def _cache_set(key: bytes, response: str) -> None:
+    with _cache_lock, _cache() as db:
+        db.execute(
+            "INSERT OR REPLACE INTO responses (key, response) VALUES (?, ?)",
+            (key, response),
+        )
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_json_schema(json_schema: str) -> dict:
+    """
+    Parses a response schema once, as every row of a query passes the same one.
+    """
+    return json.loads(json_schema)
+
 
 # Define the UDF
 def prompt(
@@ -22,7 +82,6 @@ def prompt(
     Calls the local LLM API and returns the response.
     """
     url = "http://localhost:1234/v1/chat/completions"
-    headers = {"Content-Type": "application/json"}
     payload = {
         "model": MODEL,
         "messages": [
@@ -44,22 +103,59 @@ def prompt(
     if json_schema:
         payload["response_format"] = {
             "type": "json_schema",
-            "json_schema": json.loads(json_schema),
+            "json_schema": _parse_json_schema(json_schema),
         }
 
+    # The payload is encoded once and used both as the request body and, hashed,
+    # as the cache key, so model, temperature and schema are part of the key
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    cache_key = hashlib.sha256(body).digest()
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        response = requests.post(url, headers=headers, data=json.dumps(payload))
+        response = SESSION.post(
+            url, data=body, headers={"Content-Type": "application/json"}
+        )
         response.raise_for_status()  # Raise an error for HTTP codes 4xx/5xx
 
-        return (
+        content = (
             response.json()
             .get("choices", [{}])[0]
             .get("message", {})
             .get("content", "No response")
         )
+        _cache_set(cache_key, content)
+        return content
     except requests.exceptions.RequestException as e:
         # Raise an exception to ensure the query fails
         raise RuntimeError(f"API request failed: {str(e)}") from e
     except Exception as e:
         # Handle any other exceptions
         raise RuntimeError(f"An error occurred: {str(e)}") from e
+
+
+# Define the vectorized UDF
+def prompt_batch(
+    prompt_texts: pa.Array,
+    system_messages: pa.Array,
+    json_schemas: pa.Array,
+    temperatures: pa.Array,
+) -> pa.Array:
+    """
+    Calls the local LLM API for a chunk of rows and returns the responses.
+
+    Requests are sent concurrently, up to MAX_CONCURRENT_REQUESTS at a time,
+    and the responses are returned in row order.
+    """
+    rows = zip(
+        prompt_texts.to_pylist(),
+        system_messages.to_pylist(),
+        json_schemas.to_pylist(),
+        temperatures.to_pylist(),
+        strict=True,
+    )
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS) as executor:
+        responses = list(executor.map(lambda row: prompt(*row), rows))
+    return pa.array(responses, type=pa.string())
@@ -1,3 +1,5 @@
+import math
+
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
 import numpy as np
@@ -20,6 +22,7 @@ class HeatmapAnimation(MapAnimationBase):
         date_field: str,
         label: str,
         output_path: str = "./output/",
+        render_dpi: int | None = None,
     ) -> None:
         self._bounds = None
         super().__init__(
@@ -27,8 +30,10 @@ class HeatmapAnimation(MapAnimationBase):
             date_field=date_field,
             label=label,
             output_path=output_path,
+            render_dpi=render_dpi,
         )
         self._setup_grid()
+        self.density_grids = self._create_density_grids()
 
     def _setup_grid(self) -> None:
         min_lon, max_lon, min_lat, max_lat = self._bounds
@@ -38,8 +43,8 @@ class HeatmapAnimation(MapAnimationBase):
         self.cell_area_km2 = self._calculate_cell_area_km2()
 
     def _calculate_cell_area_km2(self) -> float:
-        mean_latitude = np.mean([self._bounds[2], self._bounds[3]])
-        km_per_longitude = np.cos(mean_latitude * np.pi / 180) * self.KM_PER_LATITUDE
+        mean_latitude = (self._bounds[2] + self._bounds[3]) / 2
+        km_per_longitude = math.cos(math.radians(mean_latitude)) * self.KM_PER_LATITUDE
 
         total_area = (
             self.KM_PER_LATITUDE
@@ -49,25 +54,52 @@ class HeatmapAnimation(MapAnimationBase):
         )
         return total_area / (self.CELL_RESOLUTION * self.CELL_RESOLUTION)
 
-    def _create_density_grid(self, data: pd.DataFrame) -> np.ndarray:
-        counts, _, _ = np.histogram2d(
-            data["latitude"],
-            data["longitude"],
-            bins=[self.y_grid, self.x_grid],
+    def _create_density_grids(self) -> np.ndarray:
+        """Bin the events of all timeframes at once, one grid per frame"""
+        frames = self._get_frames()
+        frame_edges = np.arange(frames.start, frames.stop + 1) - 0.5
+        shape = (len(frames), len(self.y_grid) - 1, len(self.x_grid) - 1)
+
+        frame_idx = self._bin_indices(self.df[self.date_field], frame_edges)
+        lat_idx = self._bin_indices(self.df["latitude"], self.y_grid)
+        lon_idx = self._bin_indices(self.df["longitude"], self.x_grid)
+        inside = (frame_idx >= 0) & (lat_idx >= 0) & (lon_idx >= 0)
+
+        # Count events per flattened (frame, lat, lon) cell in a single pass
+        cells = np.ravel_multi_index(
+            (frame_idx[inside], lat_idx[inside], lon_idx[inside]), shape
         )
+        counts = np.bincount(cells, minlength=np.prod(shape)).reshape(shape)
 
-        return counts / self.cell_area_km2
+        # Densities only feed the colour scale, so float32 precision is plenty
+        return counts.astype(np.float32) / np.float32(self.cell_area_km2)
 
-    def _calculate_timeframe_density(self, data: pd.DataFrame) -> pd.DataFrame:
-        return self._create_density_grid(data)
+    @staticmethod
+    def _bin_indices(values: pd.Series, edges: np.ndarray) -> np.ndarray:
+        """Index of the evenly spaced bin each value falls in, -1 if outside"""
+        values = values.to_numpy(dtype=float)
+        bin_count = len(edges) - 1
+        scaled = (values - edges[0]) * (bin_count / (edges[-1] - edges[0]))
 
-    def _plot_frame(self, ax: plt.Axes, data: pd.DataFrame) -> None:
-        counts = self._create_density_grid(data)
+        # The last edge is inclusive; NaN values fail the comparison and get -1
+        inside = (values >= edges[0]) & (values <= edges[-1])
+        indices = np.where(inside, np.minimum(np.floor(scaled), bin_count - 1), -1)
+        return indices.astype(np.int32)
 
-        ax.pcolormesh(
+    def _get_density_grid(self, timeframe: int) -> np.ndarray:
+        return self.density_grids[timeframe - self._get_frames().start]
+
+    def _calculate_timeframe_density(
+        self, timeframe: int, data: pd.DataFrame
+    ) -> np.ndarray:
+        return self._get_density_grid(timeframe)
+
+    def _setup_frame_artists(self, ax: plt.Axes) -> None:
+        # The mesh geometry is the same for every frame, only the values change
+        self.mesh = ax.pcolormesh(
             self.x_mesh,
             self.y_mesh,
-            counts,
+            np.zeros_like(self.density_grids[0]),
             shading="auto",
             cmap=self.cmap,
             norm=self.norm,
@@ -75,6 +107,10 @@ class HeatmapAnimation(MapAnimationBase):
             transform=ccrs.PlateCarree(),
         )
 
+    def _plot_frame(self, ax: plt.Axes, timeframe: int) -> list[plt.Artist]:
+        self.mesh.set_array(self.frame_densities[timeframe])
+        return [self.mesh]
+
     def _add_colorbar(self, cbar_ax: plt.Axes) -> None:
         fig = cbar_ax.figure
         fig.colorbar(
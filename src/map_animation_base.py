@@ -1,4 +1,9 @@
+import copy
+import io
+import multiprocessing
+import os
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
 
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -6,16 +11,32 @@ import matplotlib as mpl
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-from matplotlib.animation import FuncAnimation
+from PIL import Image
+
+
+def _render_frames(
+    animation: "MapAnimationBase", timeframes: list[int]
+) -> list[Image.Image]:
+    """Render a run of frames on one figure, used by the frame worker processes"""
+    fig, map_ax = animation._create_figure()
+    images = []
+    for timeframe in timeframes:
+        animation.update(timeframe, map_ax)
+        images.append(animation._grab_frame(fig))
+    plt.close(fig)
+    return images
 
 
 class MapAnimationBase(ABC):
     """Abstract base class for map-based animations"""
 
     MAP_PADDING: float = 0.05
-    ANIMATION_INTERVAL: int = 500
     ANIMATION_FPS: int = 2
     ANIMATION_DPI: int = 72
+    # "webp" (lossless, full colour) or "gif" (8-bit palette)
+    ANIMATION_FORMAT: str = "webp"
+    # Processes rendering frames in parallel, defaults to the CPU count
+    ANIMATION_WORKERS: int | None = None
 
     def __init__(
         self,
@@ -23,6 +44,7 @@ class MapAnimationBase(ABC):
         date_field: str,
         label: str,
         output_path: str = "./output/",
+        render_dpi: int | None = None,
     ) -> None:
         if not isinstance(df, pd.DataFrame):
             raise ValueError("df must be a pandas DataFrame")
@@ -30,18 +52,28 @@ class MapAnimationBase(ABC):
             raise ValueError("date_field is required")
         if not label:
             raise ValueError("category_name is required")
+        if render_dpi is not None and render_dpi <= 0:
+            raise ValueError("render_dpi must be positive")
 
         self._validate_dataframe(df)
         self.df = df
         self.label = label
         self.output_path = output_path
+        # Draw time scales with the rasterized pixel count, so small previews
+        # can be rendered at a lower DPI than ANIMATION_DPI
+        self.render_dpi = render_dpi or self.ANIMATION_DPI
 
         self.date_field = date_field
         self._setup_bounds()
 
+        # Row positions of each timeframe, so frames are not found by
+        # scanning the whole DataFrame every time
+        self._timeframe_rows = self.df.groupby(date_field, sort=False).indices
+
     def _validate_dataframe(self, df: pd.DataFrame) -> None:
         required_columns = ["latitude", "longitude"]
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        columns = set(df.columns)
+        missing_columns = [col for col in required_columns if col not in columns]
         if missing_columns:
             raise ValueError(f"Missing required columns: {missing_columns}")
 
@@ -54,17 +86,23 @@ class MapAnimationBase(ABC):
         )
         self._bounds = self._add_padding_to_bounds(bounds)
 
-    def update(self, timeframe: int, ax: plt.Axes) -> None:
-        ax.clear()
+    def _setup_map(self, ax: plt.Axes) -> None:
+        """Draw the static parts of the map once, before the first frame"""
         bounds = self._get_bounds()
         ax.set_extent(bounds)
+        self._add_map_features(ax)
+        self.title = ax.set_title("")
+        self._setup_frame_artists(ax)
 
-        timeframe_data = self._get_timeframe_data(timeframe)
-        if len(timeframe_data) > 1:
-            self._plot_frame(ax, timeframe_data)
+    def update(self, timeframe: int, ax: plt.Axes) -> list[plt.Artist]:
+        event_count = self.frame_event_counts[timeframe]
 
-        self._add_map_features(ax)
-        ax.set_title(self._format_title(len(timeframe_data), timeframe))
+        artists = self._plot_frame(ax, timeframe)
+        for artist in artists:
+            artist.set_visible(event_count > 1)
+
+        self.title.set_text(self._format_title(event_count, timeframe))
+        return [*artists, self.title]
 
     def _get_bounds(self) -> list[float]:
         return list(self._bounds)
@@ -92,39 +130,76 @@ class MapAnimationBase(ABC):
         return f"{self.label} - {event_count:,} Events ({self.date_field.capitalize()}: {timeframe:02d})"
 
     def _get_timeframe_data(self, timeframe: int) -> pd.DataFrame:
-        return self.df[(self.df[self.date_field] == timeframe)]
+        return self.df.iloc[self._timeframe_rows.get(timeframe, [])]
 
     @abstractmethod
-    def _plot_frame(self, ax: plt.Axes, data: pd.DataFrame) -> None:
-        """Plot single animation frame"""
+    def _setup_frame_artists(self, ax: plt.Axes) -> None:
+        """Create artists that are reused across frames"""
         pass
 
     @abstractmethod
-    def _calculate_timeframe_density(self, data: pd.DataFrame) -> float:
-        """Calculate density for a single timeframe"""
+    def _plot_frame(self, ax: plt.Axes, timeframe: int) -> list[plt.Artist]:
+        """Plot single animation frame and return the updated artists"""
+        pass
+
+    @abstractmethod
+    def _calculate_timeframe_density(
+        self, timeframe: int, data: pd.DataFrame
+    ) -> np.ndarray:
+        """Calculate the density of every cell for a single timeframe"""
         pass
 
     def create_animation(self) -> None:
-        frames = self._get_frames()
+        self._setup_visualization()
+        frames = list(self._get_frames())
+
+        # Frames are independent once the densities and colour scale are set
+        # up, so contiguous runs of frames are rendered in separate processes.
+        # The workers only need those, not the events DataFrame.
+        renderer = copy.copy(self)
+        del renderer.df, renderer._timeframe_rows
+
+        workers = min(
+            self.ANIMATION_WORKERS or os.process_cpu_count() or 1, len(frames)
+        )
+        frame_runs = [run.tolist() for run in np.array_split(frames, workers)]
+        if workers > 1:
+            # Forking a parent that runs DuckDB or Jupyter threads can deadlock
+            # the children, so workers start from a clean forkserver process
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            ) as executor:
+                rendered = executor.map(
+                    _render_frames, [renderer] * workers, frame_runs
+                )
+                images = [image for run in rendered for image in run]
+        else:
+            images = _render_frames(renderer, frames)
+
+        self._save_animation(images)
+
+    def _create_figure(self) -> tuple[plt.Figure, plt.Axes]:
         fig = plt.figure(figsize=(12, 8))
 
         # Create separate axes for map and colorbar
         map_ax = plt.axes([0.1, 0.1, 0.75, 0.8], projection=ccrs.PlateCarree())
         colorbar_ax = fig.add_axes([0.85, 0.1, 0.02, 0.8])
 
-        self._setup_visualization()
         self._add_colorbar(colorbar_ax)  # Pass the colorbar axes
-
-        anim = FuncAnimation(
-            fig,
-            lambda timeframe: self.update(timeframe, map_ax),
-            frames=frames,
-            interval=self.ANIMATION_INTERVAL,
-            blit=False,
+        self._setup_map(map_ax)
+        return fig, map_ax
+
+    def _grab_frame(self, fig: plt.Figure) -> Image.Image:
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="rgba", dpi=self.render_dpi)
+        width, height = fig.get_size_inches() * self.render_dpi
+        image = Image.frombuffer(
+            "RGBA", (int(width), int(height)), buffer.getbuffer(), "raw", "RGBA", 0, 1
         )
-
-        self._save_animation(anim)
-        plt.close(fig)
+        # Opaque frames are kept as RGB, they quantize to the GIF palette
+        # better and encode smaller as WebP, as in matplotlib's PillowWriter
+        return image if image.getextrema()[3][0] < 255 else image.convert("RGB")
 
     def _get_frames(self) -> range:
         match self.date_field:
@@ -137,17 +212,31 @@ class MapAnimationBase(ABC):
 
     def _setup_visualization(self) -> None:
         timeframes = self._get_frames()
-        all_densities = []
 
-        # Collect densities from all cells in all frames
+        # Calculate densities for all cells in all frames, keeping them per
+        # frame so _plot_frame does not have to calculate them again
+        self.frame_densities: dict[int, np.ndarray] = {}
+        self.frame_event_counts: dict[int, int] = {}
         for frame in timeframes:
             data = self._get_timeframe_data(frame)
-            cell_densities = self._calculate_timeframe_density(data)
-            all_densities.extend(cell_densities[cell_densities > 0])
-
-        all_densities = np.array(all_densities)
-        self.VMIN = 10 ** np.floor(np.log10(np.percentile(all_densities, 5)))
-        self.VMAX = 10 ** np.ceil(np.log10(np.percentile(all_densities, 95)))
+            self.frame_densities[frame] = self._calculate_timeframe_density(frame, data)
+            self.frame_event_counts[frame] = len(data)
+
+        # Gather the nonzero cells into one preallocated buffer, which the
+        # quantile selection then partitions in place instead of copying
+        nonzero_masks = [d > 0 for d in self.frame_densities.values()]
+        nonzero = np.empty(sum(np.count_nonzero(m) for m in nonzero_masks), np.float32)
+        offset = 0
+        for densities, mask in zip(
+            self.frame_densities.values(), nonzero_masks, strict=True
+        ):
+            frame_nonzero = densities[mask]
+            nonzero[offset : offset + len(frame_nonzero)] = frame_nonzero
+            offset += len(frame_nonzero)
+
+        low, high = np.quantile(nonzero, [0.05, 0.95], overwrite_input=True)
+        self.VMIN = 10 ** np.floor(np.log10(low))
+        self.VMAX = 10 ** np.ceil(np.log10(high))
 
         self.norm = mpl.colors.LogNorm(vmin=self.VMIN, vmax=self.VMAX)
         self.cmap = plt.cm.get_cmap(self.COLORMAP)
@@ -160,13 +249,25 @@ class MapAnimationBase(ABC):
         """Add colorbar to plot"""
         pass
 
-    def _save_animation(self, anim: FuncAnimation) -> None:
+    def _save_animation(self, images: list[Image.Image]) -> None:
         label_filename = self.label.lower().replace("/", "_").replace(" ", "_")
 
-        filename = f"./{self.output_path}/{label_filename}.gif"
-        anim.save(
+        match self.ANIMATION_FORMAT:
+            case "webp":
+                # Lossless WebP keeps every colour and is about half the size
+                # of the palettized GIF, libwebp also encodes it faster
+                options = {"lossless": True, "quality": 50, "method": 4}
+            case "gif":
+                options = {}
+            case _:
+                raise ValueError("ANIMATION_FORMAT must be 'webp' or 'gif'")
+
+        filename = f"./{self.output_path}/{label_filename}.{self.ANIMATION_FORMAT}"
+        images[0].save(
             filename,
-            writer="pillow",
-            fps=self.ANIMATION_FPS,
-            dpi=self.ANIMATION_DPI,
+            save_all=True,
+            append_images=images[1:],
+            duration=int(1000 / self.ANIMATION_FPS),
+            loop=0,
+            **options,
         )